@@ -7,13 +7,79 @@ and the duration of stays.
 It supports generating basic statistics and summaries by city, country, or year.
 """
 
+import numpy as np
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
 from pathlib import Path
+from typing import Callable
 import logging
-import difflib
+from rapidfuzz import fuzz, process
+import pyarrow as pa
+from parquet_cache import read_cache, write_cache
 
 logger = logging.getLogger(__name__)
 
+# Dates are stored day first in the CSV files
+_DATE_COLUMNS = ("start_date", "end_date")
+_DATE_FORMAT = "%d/%m/%Y"
+
+# Columns that support case-insensitive and fuzzy lookups
+_LOOKUP_COLUMNS = ("city", "country")
+
+# Column types of the CSV files
+_CSV_DTYPES = {column: "category" for column in _LOOKUP_COLUMNS}
+
+# Marker of the parsing settings stored in the Parquet caches of the CSV files.
+# Bump the leading version when changing the parsing in any other way.
+_CSV_CACHE_SCHEMA = f"1;{_CSV_DTYPES};{_DATE_COLUMNS};{_DATE_FORMAT}"
+
+
+def _derive_days_and_years(
+    start_dates: np.ndarray, end_dates: np.ndarray
+) -> tuple[pd.arrays.IntegerArray, pd.arrays.IntegerArray]:
+    """Compute the days lived and the starting year of each stay."""
+    missing_start = np.isnat(start_dates)
+    missing_days = missing_start | np.isnat(end_dates)
+    start_days = start_dates.astype("datetime64[D]")
+    end_days = end_dates.astype("datetime64[D]")
+    days_lived = (end_days - start_days).view("i8")
+    years = start_days.astype("datetime64[Y]").view("i8") + 1970
+    return (
+        pd.arrays.IntegerArray(
+            np.where(missing_days, 0, days_lived).astype(np.int32), missing_days
+        ),
+        pd.arrays.IntegerArray(
+            np.where(missing_start, 0, years).astype(np.int16), missing_start
+        ),
+    )
+
+
+def _summarize_stays(
+    df: pd.DataFrame, mask: np.ndarray
+) -> tuple[int, date | None, date | None, int]:
+    """Get the total days lived, first and last stay and number of the masked stays."""
+    days = df["days_lived"].array[mask]
+    if not len(days):
+        return 0, None, None, 0
+    return (
+        days.sum(),
+        df["start_date"].array[mask].min().date(),
+        df["end_date"].array[mask].max().date(),
+        len(days),
+    )
+
+
+def _match_year(df: pd.DataFrame, year: int) -> np.ndarray:
+    """Get a boolean mask of the stays starting in a year."""
+    return (df["year"] == year).to_numpy(dtype=bool, na_value=False)
+
+
+def _get_categories(column: pd.Series, mask: np.ndarray) -> list:
+    """Get the categories present in the masked rows, in order of appearance."""
+    codes = pd.unique(column.cat.codes.to_numpy()[mask])
+    return column.cat.categories[codes[codes >= 0]].tolist()
+
 
 class _Database:
     """Wrapper class for managing data stored in CSV files as Pandas DataFrames."""
@@ -22,14 +88,26 @@ class _Database:
         """Initialize the database by loading data from one or more CSV files."""
         if isinstance(file_paths, Path):
             file_paths = [file_paths]
-        self.dataframes = {file.stem: self._load_data(file) for file in file_paths}
+        with ThreadPoolExecutor(max_workers=min(8, len(file_paths) or 1)) as executor:
+            dataframes = executor.map(self._load_data, file_paths)
+        self.dataframes = {
+            file.stem: df for file, df in zip(file_paths, dataframes, strict=True)
+        }
         self.__post_init__()
 
     def __post_init__(self) -> None:
         """Complete dataframe initialization by calculating additional fields."""
-        for df in self.dataframes.values():
-            df["days_lived"] = (df["end_date"] - df["start_date"]).dt.days
-            df["year"] = df["start_date"].dt.year
+        self._default_key: str | None = next(iter(self.dataframes), None)
+        self._unique_values: dict[str, dict[str, list[str]]] = {}
+        for key, df in self.dataframes.items():
+            df["days_lived"], df["year"] = _derive_days_and_years(
+                df["start_date"].to_numpy(), df["end_date"].to_numpy()
+            )
+            for column in _LOOKUP_COLUMNS:
+                df[f"_{column}_lower"] = df[column].str.lower()
+            self._unique_values[key] = {
+                column: df[column].cat.categories.tolist() for column in _LOOKUP_COLUMNS
+            }
 
     def _load_data(self, file_path: Path) -> pd.DataFrame:
         """Load data from a CSV file into a Pandas DataFrame.
@@ -40,72 +118,125 @@ class _Database:
             logger.warning(f"The file {file_path} is not a CSV.")
             return pd.DataFrame()
 
-        return pd.read_csv(
-            file_path, parse_dates=["start_date", "end_date"], dayfirst=True
-        )
+        cached_table = read_cache(file_path, _CSV_CACHE_SCHEMA)
+        if cached_table is not None:
+            return cached_table.to_pandas()
+
+        df = pd.read_csv(file_path, engine="pyarrow", dtype=_CSV_DTYPES)
+        for column in _DATE_COLUMNS:
+            df[column] = pd.to_datetime(df[column], format=_DATE_FORMAT)
+
+        write_cache(pa.Table.from_pandas(df), file_path, _CSV_CACHE_SCHEMA)
+        return df
 
 
 class ExtendedDatabase(_Database):
     """Extended functionality for managing and analyzing location-based data."""
 
+    def __post_init__(self) -> None:
+        """Complete initialization and set up the aggregation cache."""
+        super().__post_init__()
+        self._aggregations: dict[tuple[str, str], pd.Series | pd.DataFrame] = {}
+
     def get_basic_stats(self, key: str | None = None) -> dict:
         """Generate basic statistics from the data."""
         df = self._get_dataframe(key)
+        days = df["days_lived"].array
         return {
-            "total_days_lived": df["days_lived"].sum() if not df.empty else 0,
-            "average_days_per_location": df["days_lived"].mean() if not df.empty else 0,
-            "number_of_locations": df["city"].nunique(),
+            "total_days_lived": days.sum() if len(days) else 0,
+            "average_days_per_location": days.mean() if len(days) else 0,
+            "number_of_locations": len(df["city"].cat.categories),
             "years_covered": df["year"].nunique(),
         }
 
     def get_location_summary(self, city: str, exact_match: bool = True) -> dict:
         """Get a summary of stays in a particular city."""
-        df = self._filter_by_location(city, exact_match)
+        df = self._get_dataframe()
+        mask = self._match("city", city, exact_match)
+        total_days, first_stay, last_stay, number_of_stays = _summarize_stays(df, mask)
         return {
             "city": city,
-            "total_days_lived": df["days_lived"].sum() if not df.empty else 0,
-            "first_stay": df["start_date"].min().date() if not df.empty else None,
-            "last_stay": df["end_date"].max().date() if not df.empty else None,
-            "number_of_stays": df.shape[0],
+            "total_days_lived": total_days,
+            "first_stay": first_stay,
+            "last_stay": last_stay,
+            "number_of_stays": number_of_stays,
         }
 
     def get_country_summary(self, country: str, exact_match: bool = True) -> dict:
         """Get a summary of stays in a particular country."""
-        df = self._filter_by_country(country, exact_match)
+        df = self._get_dataframe()
+        mask = self._match("country", country, exact_match)
+        total_days, first_stay, last_stay, number_of_stays = _summarize_stays(df, mask)
+        cities = _get_categories(df["city"], mask)
         return {
             "country": country,
-            "total_days_lived": df["days_lived"].sum() if not df.empty else 0,
-            "cities": df["city"].unique().tolist(),
-            "number_of_cities": df["city"].nunique(),
-            "first_stay": df["start_date"].min().date() if not df.empty else None,
-            "last_stay": df["end_date"].max().date() if not df.empty else None,
-            "number_of_stays": df.shape[0],
+            "total_days_lived": total_days,
+            "cities": cities,
+            "number_of_cities": len(cities),
+            "first_stay": first_stay,
+            "last_stay": last_stay,
+            "number_of_stays": number_of_stays,
         }
 
     def get_year_summary(self, year: int) -> dict:
         """Get a summary of stays in a particular year."""
-        df = self._filter_by_year(year)
+        df = self._get_dataframe()
+        mask = _match_year(df, year)
         return {
             "year": year,
-            "number_of_countries": df["country"].nunique(),
-            "number_of_locations": df["city"].nunique(),
-            "number_of_stays": df.shape[0],
+            "number_of_countries": len(_get_categories(df["country"], mask)),
+            "number_of_locations": len(_get_categories(df["city"], mask)),
+            "number_of_stays": int(mask.sum()),
         }
 
     def get_countries_days_lived(self, key: str | None = None) -> pd.DataFrame:
         """Generate a list of countries and the total days lived in each."""
-        df = self._get_dataframe(key)
-        country_days = df.groupby("country")["days_lived"].sum().reset_index()
+        country_days = self._get_days_lived_by("country", key).reset_index()
         country_days.columns = ["country", "total_days_lived"]
         return country_days
 
     def get_cities_days_lived(self, key: str | None = None) -> pd.DataFrame:
         """Generate a list of cities and the total days lived in each."""
-        df = self._get_dataframe(key)
-        city_days = df.groupby("city")["days_lived"].sum().reset_index()
+        city_days = self._get_days_lived_by("city", key).reset_index()
         city_days.columns = ["city", "total_days_lived"]
         return city_days
 
+    def get_city_year_days_lived(self, key: str | None = None) -> pd.DataFrame:
+        """Generate a city-by-year table of the total days lived."""
+        return self._get_aggregation(
+            "city_year",
+            lambda df: df.pivot_table(
+                index="city",
+                columns="year",
+                values="days_lived",
+                aggfunc="sum",
+                fill_value=0,
+                observed=True,
+            ),
+            key,
+        )
+
+    def _get_days_lived_by(self, column_name: str, key: str | None = None) -> pd.Series:
+        """Get the total days lived per value of the given column."""
+        return self._get_aggregation(
+            column_name,
+            lambda df: df.groupby(column_name, observed=True)["days_lived"].sum(),
+            key,
+        )
+
+    def _get_aggregation(
+        self,
+        name: str,
+        aggregate: Callable[[pd.DataFrame], pd.Series | pd.DataFrame],
+        key: str | None = None,
+    ) -> pd.Series | pd.DataFrame:
+        """Get a copy of an aggregation of a dataframe, computed once and cached."""
+        df = self._get_dataframe(key)
+        key = self._get_key(key)
+        if (key, name) not in self._aggregations:
+            self._aggregations[key, name] = aggregate(df)
+        return self._aggregations[key, name].copy()
+
     def _filter_by(
         self,
         column_name: str,
@@ -113,27 +244,45 @@ class ExtendedDatabase(_Database):
         exact_match: bool = True,
         key: str | None = None,
     ) -> pd.DataFrame:
-        """General method to filter dataframe by any column."""
-        df = self._get_dataframe(key)
+        """General method to filter dataframe by any of the lookup columns."""
+        mask = self._match(column_name, value, exact_match, key)
+        return self._get_dataframe(key).iloc[np.flatnonzero(mask)]
+
+    def _match(
+        self,
+        column_name: str,
+        value: str,
+        exact_match: bool = True,
+        key: str | None = None,
+    ) -> np.ndarray:
+        """Get a boolean mask of the rows matching a value of a lookup column.
+
+        If no close match is found, the returned mask selects no rows.
+        """
+        lower_values = self._get_dataframe(key)[f"_{column_name}_lower"].to_numpy()
+        key = self._get_key(key)
         if exact_match:
-            return df[df[column_name].str.lower() == value.lower()]
+            return lower_values == value.lower()
         else:
-            closest_matches = difflib.get_close_matches(
-                value, df[column_name].unique(), n=1, cutoff=0.8
+            closest_match = process.extractOne(
+                value,
+                self._unique_values[key][column_name],
+                scorer=fuzz.WRatio,
+                score_cutoff=80,
             )
-            if closest_matches:
+            if closest_match is not None:
                 logger.info(
-                    f"Using closest match for {column_name}: {closest_matches[0]}"
+                    f"Using closest match for {column_name}: {closest_match[0]}"
                 )
-                return df[df[column_name].str.lower() == closest_matches[0].lower()]
+                return lower_values == closest_match[0].lower()
             else:
                 logger.warning(f"No close match found for {column_name}: {value}.")
-                return pd.DataFrame()
+                return np.zeros(len(lower_values), dtype=bool)
 
     def _filter_by_year(self, year: int, key: str | None = None) -> pd.DataFrame:
         """Filter the dataframe by year."""
         df = self._get_dataframe(key)
-        return df[df["year"] == year]
+        return df.iloc[np.flatnonzero(_match_year(df, year))]
 
     def _filter_by_location(
         self, city: str, exact_match: bool = True, key: str | None = None
@@ -149,4 +298,11 @@ class ExtendedDatabase(_Database):
 
     def _get_dataframe(self, key: str | None = None) -> pd.DataFrame:
         """Retrieve the appropriate dataframe."""
-        return self.dataframes[key] if key else next(iter(self.dataframes.values()))
+        key = self._get_key(key)
+        if key is None:
+            raise ValueError("No dataframe has been loaded.")
+        return self.dataframes[key]
+
+    def _get_key(self, key: str | None = None) -> str | None:
+        """Resolve the dataframe key, defaulting to the first loaded file."""
+        return key if key else self._default_key
@@ -15,6 +15,7 @@ db = ExtendedDatabase(_EXAMPLE_DATA_PATH)
 df = db._get_dataframe()
 countries_data = db.get_countries_days_lived()
 cities_data = db.get_cities_days_lived()
+city_year_data = db.get_city_year_days_lived()
 
 # Generate and print basic statistics
 stats = db.get_basic_stats()
@@ -39,7 +40,7 @@ plot_country_distribution(df)
 plot_city_distribution(df)
 
 # Plot and display the top cities over time
-plot_top_cities_over_time(df, top_n=10)
+plot_top_cities_over_time(df, top_n=10, city_year_data=city_year_data)
 
 # Plot and display a world map with color-coded values per country
 countries = countries_data["country"]
@@ -54,7 +55,7 @@ print(f"Summary of cities:\n{cities_data}\n")
 plot_visited_countries_map(countries)
 
 # Plot and display the top 5 cities with the most days lived over time (cumulative)
-plot_top_cities_over_time(df, top_n=5, cumulative=True)
+plot_top_cities_over_time(df, top_n=5, cumulative=True, city_year_data=city_year_data)
 
 # Plot and display the distribution of days lived across countries (without log scale)
 plot_country_distribution(df, log_scale=False)
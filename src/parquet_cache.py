@@ -0,0 +1,82 @@
+"""Parquet caching of parsed source files.
+
+Parsed data is cached in a Parquet file next to its source file, so that later
+runs skip parsing. Each cache records a schema marker describing how the source
+was parsed, and is only reused while it is newer than the source and its marker
+matches, so changing the parsing settings invalidates existing caches.
+"""
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+from typing import Iterable
+import logging
+import os
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+# Key of the schema marker in the Parquet file metadata
+_SCHEMA_KEY = b"homebase.schema"
+
+
+def _get_cache_path(source_path: Path) -> Path:
+    """Get the path of the Parquet cache of a source file."""
+    return source_path.with_suffix(".parquet")
+
+
+def read_cache(
+    source_path: Path, schema: str, dependency_paths: Iterable[Path] = ()
+) -> pa.Table | None:
+    """Read the cached table of a source file.
+
+    Returns None if there is no cache, if it is older than the source file or
+    any of the other files it depends on, if it was written with a different
+    schema marker or if it cannot be read.
+    """
+    cache_path = _get_cache_path(source_path)
+    if not cache_path.exists():
+        return None
+    source_mtime = max(
+        path.stat().st_mtime for path in (source_path, *dependency_paths)
+    )
+    if cache_path.stat().st_mtime < source_mtime:
+        return None
+
+    try:
+        metadata = pq.read_schema(cache_path).metadata or {}
+        if metadata.get(_SCHEMA_KEY) != schema.encode():
+            logger.info(f"Ignoring the outdated Parquet cache of {source_path}.")
+            return None
+        return pq.read_table(cache_path)
+    except (pa.ArrowInvalid, OSError) as error:
+        logger.warning(f"Could not read the Parquet cache of {source_path}: {error}")
+        return None
+
+
+def write_cache(table: pa.Table, source_path: Path, schema: str) -> None:
+    """Cache the table of a source file, tagged with its schema marker.
+
+    The table is written to a temporary file that is then moved into place, so
+    an interrupted write never leaves a truncated cache behind. Failing to write
+    the cache is not an error, as the source can be parsed again on the next run.
+    """
+    table = table.replace_schema_metadata(
+        {**(table.schema.metadata or {}), _SCHEMA_KEY: schema.encode()}
+    )
+    cache_path = _get_cache_path(source_path)
+    temp_path = None
+    try:
+        with tempfile.NamedTemporaryFile(
+            dir=cache_path.parent,
+            prefix=f".{cache_path.stem}.",
+            suffix=".parquet",
+            delete=False,
+        ) as temp_file:
+            temp_path = Path(temp_file.name)
+            pq.write_table(table, temp_file, compression="zstd")
+        os.replace(temp_path, cache_path)
+    except OSError as error:
+        logger.warning(f"Could not cache {source_path} as Parquet: {error}")
+        if temp_path is not None:
+            temp_path.unlink(missing_ok=True)
@@ -11,19 +11,161 @@ It includes capabilities for plotting:
 import cartopy.crs as ccrs
 from cartopy.mpl.geoaxes import GeoAxes
 import cartopy.feature as cfeature
+import matplotlib
+import os
+
+# Render without a GUI event loop for batch runs
+if os.environ.get("HOMEBASE_HEADLESS"):
+    matplotlib.use("Agg")
+
 import matplotlib.pyplot as plt
-from cartopy.io.shapereader import Reader
+from matplotlib import colormaps
+from matplotlib.collections import LineCollection
+from matplotlib.colors import Colormap, to_rgba_array
+from matplotlib.lines import Line2D
 from cartopy.feature import ShapelyFeature
+import pyarrow as pa
+from pyogrio.raw import read_arrow
+from pyproj import CRS, Transformer
+from parquet_cache import read_cache, write_cache
+import shapely
+from shapely.geometry.base import BaseGeometry
 from pathlib import Path
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Mapping
+import logging
 import warnings
+import numpy as np
 import pandas as pd
-from math import log
+
+logger = logging.getLogger(__name__)
 
 # Default shapefile path
 _SHAPEFILE_PATH = (
     Path("data") / "ne_110m_admin_0_countries" / "ne_110m_admin_0_countries.shp"
 )
 
+# Coordinate reference system of the shapefile geometries (EPSG:4326)
+_SHAPEFILE_CRS = ccrs.PlateCarree()
+
+# Tolerance (in degrees) used to drop sub-pixel vertices from country geometries
+_SIMPLIFY_TOLERANCE = 0.1
+
+# Sidecar files of a shapefile holding its index, attributes, CRS and encoding
+_SHAPEFILE_SIDECAR_SUFFIXES = (".shx", ".dbf", ".prj", ".cpg")
+
+# Attribute columns read from the shapefile
+_SHAPEFILE_COLUMNS = ["NAME"]
+
+# Marker of the reading settings stored in the Parquet cache of the shapefile.
+# Bump the leading version when changing the reading in any other way.
+_SHAPEFILE_CACHE_SCHEMA = f"1;{_SHAPEFILE_COLUMNS}"
+
+
+def _show_or_save(
+    figure: plt.Figure, show: bool, out_path: Path | None = None, close: bool = False
+) -> None:
+    """Save the figure if an output path is given, otherwise show it.
+
+    A saved figure is closed if requested, so that figures created by the plot
+    functions do not pile up in batch runs.
+    """
+    if out_path is not None:
+        figure.savefig(out_path, dpi=100, bbox_inches="tight")
+        if close:
+            plt.close(figure)
+    elif show:
+        plt.show()
+
+
+@lru_cache
+def _get_colormap(cmap_name: str) -> Colormap:
+    """Get a registered colormap, reusing it across plot calls."""
+    return colormaps[cmap_name]
+
+
+@lru_cache(maxsize=4)
+def _load_shapefile(shapefile_path: Path) -> Mapping[str, BaseGeometry]:
+    """Load the simplified country geometries of a shapefile, indexed by name."""
+    table = _read_countries_table(shapefile_path)
+    geometries = shapely.simplify(
+        shapely.from_wkb(table["geometry"].to_numpy(zero_copy_only=False)),
+        _SIMPLIFY_TOLERANCE,
+        preserve_topology=True,
+    )
+    return MappingProxyType(dict(zip(table["NAME"].to_pylist(), geometries)))
+
+
+def _read_countries_table(shapefile_path: Path) -> pa.Table:
+    """Read the country names and WKB geometries of a shapefile into a table."""
+    sidecar_paths = [
+        path
+        for path in map(shapefile_path.with_suffix, _SHAPEFILE_SIDECAR_SUFFIXES)
+        if path.exists()
+    ]
+    cached_table = read_cache(shapefile_path, _SHAPEFILE_CACHE_SCHEMA, sidecar_paths)
+    if cached_table is not None:
+        return cached_table
+
+    metadata, table = read_arrow(shapefile_path, columns=_SHAPEFILE_COLUMNS)
+    geometries = table[metadata["geometry_name"] or "wkb_geometry"].cast(pa.binary())
+    if metadata["crs"] is None:
+        logger.warning(f"No CRS found for {shapefile_path}, assuming EPSG:4326.")
+    else:
+        crs = CRS.from_user_input(metadata["crs"])
+        if not crs.equals("EPSG:4326", ignore_axis_order=True):
+            geometries = _reproject_to_lon_lat(geometries, crs)
+    table = pa.table({"NAME": table["NAME"], "geometry": geometries})
+
+    write_cache(table, shapefile_path, _SHAPEFILE_CACHE_SCHEMA)
+    return table
+
+
+def _reproject_to_lon_lat(geometries: pa.ChunkedArray, crs: CRS) -> pa.Array:
+    """Reproject WKB geometries from the given CRS to EPSG:4326 lon/lat."""
+    transformer = Transformer.from_crs(crs, "EPSG:4326", always_xy=True)
+    reprojected = shapely.transform(
+        shapely.from_wkb(geometries.to_numpy(zero_copy_only=False)),
+        lambda coords: np.column_stack(transformer.transform(*coords.T)),
+    )
+    return pa.array(shapely.to_wkb(reprojected), type=pa.binary())
+
+
+def _add_countries_feature(
+    ax: GeoAxes,
+    shapefile_path: Path,
+    colors_by_name: Mapping[str, tuple[float, ...]],
+) -> None:
+    """Draw the borders of all countries, filling the given ones, as one feature."""
+    geometries = _load_shapefile(shapefile_path)
+    styles = {
+        geometry: {
+            "facecolor": colors_by_name[name],
+            "edgecolor": "black",
+            "linewidth": 0.2,
+        }
+        for name, geometry in geometries.items()
+        if name in colors_by_name
+    }
+    ax.add_feature(
+        ShapelyFeature(
+            [
+                *(
+                    geometry
+                    for name, geometry in geometries.items()
+                    if name not in colors_by_name
+                ),
+                *styles,
+            ],
+            _SHAPEFILE_CRS,
+        ),
+        facecolor="none",
+        edgecolor="gray",
+        linewidth=0.1,
+        styler=lambda geometry: styles.get(geometry, {}),
+    )
+
 
 def plot_country_values(
     countries: list[str],
@@ -34,49 +176,108 @@ def plot_country_values(
     projection: ccrs.Projection = ccrs.PlateCarree(),
     log_scale: bool = True,
     show: bool = True,
+    out_path: Path | None = None,
+    ax: GeoAxes | None = None,
 ) -> None:
-    """Plot a world map with values associated with specific countries."""
+    """Plot a world map with values associated with specific countries.
+
+    An existing map axes can be passed to draw on, in which case its projection
+    is used instead of `projection`.
+    """
     if len(countries) != len(values):
         raise ValueError("Length of 'countries' and 'values' lists must be the same.")
 
     with warnings.catch_warnings():
         warnings.simplefilter("ignore", category=UserWarning)
 
-        ax: GeoAxes = plt.axes(projection=projection)
+        owns_figure = ax is None
+        if owns_figure:
+            ax = plt.figure().add_subplot(projection=projection)
         ax.add_feature(cfeature.LAND)
         ax.add_feature(cfeature.OCEAN)
         ax.add_feature(cfeature.COASTLINE)
         ax.add_feature(cfeature.BORDERS, linestyle="-", linewidth=0.5)
 
-        countries_feature = ShapelyFeature(
-            Reader(shapefile_path).geometries(), projection
-        )
-        ax.add_feature(
-            countries_feature, facecolor="none", edgecolor="gray", linewidth=0.1
-        )
+        geometries = _load_shapefile(shapefile_path)
+        cmap = _get_colormap(cmap_name)
+        norm_values = np.asarray(values, dtype=np.float64)
+        if log_scale:
+            positive = norm_values > 0
+            log_values = np.zeros_like(norm_values)
+            np.log(norm_values, out=log_values, where=positive)
+            norm_values = np.add(log_values, 1, out=log_values, where=positive)
+        colors = cmap(norm_values / norm_values.max())
 
-        cmap = plt.cm.get_cmap(cmap_name)
-        max_val = (
-            max(log(value) + 1 if value > 0 else 0 for value in values)
-            if log_scale
-            else max(values)
+        colors_by_name = dict(zip(countries, colors))
+        missing_countries = colors_by_name.keys() - geometries.keys()
+        if missing_countries:
+            logger.warning(
+                "Countries not found in the shapefile: "
+                f"{', '.join(sorted(missing_countries))}."
+            )
+
+        _add_countries_feature(
+            ax,
+            shapefile_path,
+            {name: tuple(color) for name, color in colors_by_name.items()},
         )
 
-        for country, value in zip(countries, values):
-            norm_value = log(value) + 1 if value > 0 and log_scale else value
-            for geom in Reader(shapefile_path).records():
-                if geom.attributes["NAME"] == country:
-                    ax.add_geometries(
-                        [geom.geometry],
-                        projection,
-                        facecolor=cmap(norm_value / max_val),
-                        edgecolor="black",
-                        linewidth=0.2,
-                    )
+        ax.set_title(title)
+        _show_or_save(ax.figure, show, out_path, close=owns_figure)
+
 
-        plt.title(title)
-        if show:
-            plt.show()
+def _get_top_positions(
+    totals: np.ndarray, top_n: int, exclude_top: int = 0
+) -> np.ndarray:
+    """Get the positions of the largest totals after the `exclude_top` first."""
+    k = min(top_n + exclude_top, totals.size)
+    if k == 0:
+        return np.empty(0, dtype=np.intp)
+    candidates = np.argpartition(-totals, k - 1)[:k]
+    order = np.lexsort((candidates, -totals[candidates]))
+    return candidates[order][exclude_top:]
+
+
+def _get_top_city_year_data(
+    df: pd.DataFrame, top_n: int, exclude_top: int = 0, cumulative: bool = False
+) -> pd.DataFrame:
+    """Get the days lived per year in the top cities, as a city-by-year table."""
+    cities = df["city"].astype("category")
+    city_codes = cities.cat.codes.to_numpy()
+    dated = df["year"].notna().to_numpy()
+    years = df["year"].to_numpy(dtype=np.intp, na_value=0)
+    first_year = years[dated].min()
+    year_codes = np.where(dated, years - first_year, 0)
+    num_years = year_codes.max() + 1
+    days = df["days_lived"].to_numpy(dtype=np.float64, na_value=0)
+
+    # Stays without a year are left out, as are missing cities
+    valid = (city_codes >= 0) & dated
+    city_totals = np.bincount(
+        city_codes[valid], weights=days[valid], minlength=len(cities.cat.categories)
+    )
+    top_codes = _get_top_positions(city_totals, top_n, exclude_top)
+
+    # Map city codes to table rows; the extra last slot catches missing cities
+    rows = np.full(len(cities.cat.categories) + 1, -1)
+    rows[top_codes] = np.arange(len(top_codes))
+    row_codes = rows[city_codes]
+    selected = (row_codes >= 0) & dated
+
+    city_year_data = np.bincount(
+        row_codes[selected] * num_years + year_codes[selected],
+        weights=days[selected],
+        minlength=len(top_codes) * num_years,
+    ).reshape(len(top_codes), num_years)
+    observed_years = np.bincount(year_codes[dated], minlength=num_years) > 0
+    city_year_data = city_year_data[:, observed_years]
+    if cumulative:
+        np.cumsum(city_year_data, axis=1, out=city_year_data)
+    return pd.DataFrame(
+        city_year_data,
+        index=pd.Index(cities.cat.categories[top_codes], name="city"),
+        columns=pd.Index(first_year + np.flatnonzero(observed_years), name="year"),
+    )
 
 
 def plot_top_cities_over_time(
@@ -90,34 +291,66 @@ def plot_top_cities_over_time(
     ylabel: str = "days lived",
     figsize: tuple = (15, 10),
     show: bool = True,
+    out_path: Path | None = None,
+    city_year_data: pd.DataFrame | None = None,
+    ax: plt.Axes | None = None,
 ) -> None:
-    """Plot the top N cities with the most days lived over time."""
-    city_year_data = (
-        df.groupby(["city", "year"])["days_lived"].sum().unstack().fillna(0)
+    """Plot the top N cities with the most days lived over time.
+
+    A precomputed city-by-year table (see
+    `ExtendedDatabase.get_city_year_days_lived`) can be passed to skip the
+    aggregation of `df`. An existing axes can be passed to draw on, in which
+    case `figsize` is ignored.
+    """
+    if city_year_data is None:
+        city_year_data = _get_top_city_year_data(df, top_n, exclude_top, cumulative)
+    else:
+        city_year_data = city_year_data.iloc[
+            _get_top_positions(
+                city_year_data.sum(axis=1).to_numpy(), top_n, exclude_top
+            )
+        ]
+        if cumulative:
+            city_year_data = city_year_data.cumsum(axis=1)
+
+    years = city_year_data.columns.to_numpy(dtype=np.float64)
+    days = city_year_data.to_numpy(dtype=np.float64)
+    color_cycle = plt.rcParams["axes.prop_cycle"].by_key()["color"]
+    colors = to_rgba_array(
+        [color_cycle[i % len(color_cycle)] for i in range(len(days))]
     )
-    top_cities = (
-        city_year_data.sum(axis=1).nlargest(top_n + exclude_top).index[exclude_top:]
+
+    # All cities are drawn as a single collection, plus one scatter for markers
+    owns_figure = ax is None
+    if owns_figure:
+        _, ax = plt.subplots(figsize=figsize)
+    ax.add_collection(
+        LineCollection(
+            np.stack(np.broadcast_arrays(years, days), axis=-1), colors=colors
+        )
     )
-    city_year_data = (
-        city_year_data.loc[top_cities].cumsum(axis=1)
-        if cumulative
-        else city_year_data.loc[top_cities]
+    ax.scatter(
+        np.tile(years, len(days)), days.ravel(), c=np.repeat(colors, len(years), axis=0)
     )
-
-    ax = city_year_data.T.plot(kind="line", figsize=figsize, marker="o")
     ax.set_yscale("log" if log_scale else "linear")
+    ax.autoscale_view()
 
     plot_title = title or f"top {top_n} cities with most days lived"
     if cumulative:
         plot_title += " (cumulative)"
 
-    plt.title(plot_title)
-    plt.xlabel(xlabel)
-    plt.ylabel(ylabel)
-    plt.legend(title="city")
-    plt.grid(True)
-    if show:
-        plt.show()
+    ax.set_title(plot_title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    ax.legend(
+        handles=[
+            Line2D([], [], color=color, marker="o", label=city)
+            for city, color in zip(city_year_data.index, colors)
+        ],
+        title="city",
+    )
+    ax.grid(True)
+    _show_or_save(ax.figure, show, out_path, close=owns_figure)
 
 
 def plot_visited_countries_map(
@@ -127,42 +360,39 @@ def plot_visited_countries_map(
     cmap_name: str = "GnBu",
     projection: ccrs.Projection = ccrs.PlateCarree(),
     show: bool = True,
+    out_path: Path | None = None,
+    ax: GeoAxes | None = None,
 ) -> None:
-    """Plot a world map highlighting the countries visited."""
+    """Plot a world map highlighting the countries visited.
+
+    An existing map axes can be passed to draw on, in which case its projection
+    is used instead of `projection`.
+    """
     unique_countries = set(countries)
     num_countries_visited = len(unique_countries)
 
     with warnings.catch_warnings():
         warnings.simplefilter("ignore", category=UserWarning)
 
-        ax: GeoAxes = plt.axes(projection=projection)
+        owns_figure = ax is None
+        if owns_figure:
+            ax = plt.figure().add_subplot(projection=projection)
         ax.add_feature(cfeature.LAND)
         ax.add_feature(cfeature.OCEAN)
         ax.add_feature(cfeature.COASTLINE)
         ax.add_feature(cfeature.BORDERS, linestyle="-", linewidth=0.5)
 
-        countries_feature = ShapelyFeature(
-            Reader(shapefile_path).geometries(), projection
-        )
-        ax.add_feature(
-            countries_feature, facecolor="none", edgecolor="gray", linewidth=0.1
+        # Fixed color value for all visited countries
+        color = _get_colormap(cmap_name)(0.6)
+        _add_countries_feature(
+            ax,
+            shapefile_path,
+            dict.fromkeys(unique_countries, color),
         )
 
-        cmap = plt.cm.get_cmap(cmap_name)
-        for geom in Reader(shapefile_path).records():
-            if geom.attributes["NAME"] in unique_countries:
-                ax.add_geometries(
-                    [geom.geometry],
-                    projection,
-                    facecolor=cmap(0.6),  # Fixed color value for all visited countries
-                    edgecolor="black",
-                    linewidth=0.2,
-                )
-
         plot_title = title or f"Countries Visited: {num_countries_visited}"
-        plt.title(plot_title)
-        if show:
-            plt.show()
+        ax.set_title(plot_title)
+        _show_or_save(ax.figure, show, out_path, close=owns_figure)
 
 
 def plot_city_distribution(
@@ -175,19 +405,30 @@ def plot_city_distribution(
     figsize: tuple = (15, 10),
     rotation: int = 45,
     show: bool = True,
+    out_path: Path | None = None,
+    ax: plt.Axes | None = None,
 ) -> None:
-    """Plot the distribution of days lived across different cities."""
-    city_days = df.groupby("city")["days_lived"].sum().sort_values(ascending=False)
-    ax = city_days.plot(kind="bar", figsize=figsize, color=color)
+    """Plot the distribution of days lived across different cities.
+
+    An existing axes can be passed to draw on, in which case `figsize` is ignored.
+    """
+    city_days = (
+        df.groupby("city", observed=True, sort=False)["days_lived"]
+        .sum()
+        .sort_values(ascending=False, kind="stable")
+    )
+    owns_figure = ax is None
+    ax = city_days.plot(
+        kind="bar", figsize=figsize if owns_figure else None, color=color, ax=ax
+    )
     ax.set_yscale("log" if log_scale else "linear")
-    plt.title(title)
-    plt.xlabel(xlabel)
-    plt.ylabel(ylabel)
-    plt.xticks(rotation=rotation, ha="right")
-    plt.tight_layout()
-    plt.grid(True)
-    if show:
-        plt.show()
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    plt.setp(ax.get_xticklabels(), rotation=rotation, ha="right")
+    ax.figure.tight_layout()
+    ax.grid(True)
+    _show_or_save(ax.figure, show, out_path, close=owns_figure)
 
 
 def plot_country_distribution(
@@ -200,18 +441,27 @@ def plot_country_distribution(
     figsize: tuple = (15, 10),
     rotation: int = 45,
     show: bool = True,
+    out_path: Path | None = None,
+    ax: plt.Axes | None = None,
 ) -> None:
-    """Plot the distribution of days lived across different countries."""
+    """Plot the distribution of days lived across different countries.
+
+    An existing axes can be passed to draw on, in which case `figsize` is ignored.
+    """
     country_days = (
-        df.groupby("country")["days_lived"].sum().sort_values(ascending=False)
+        df.groupby("country", observed=True, sort=False)["days_lived"]
+        .sum()
+        .sort_values(ascending=False, kind="stable")
+    )
+    owns_figure = ax is None
+    ax = country_days.plot(
+        kind="bar", figsize=figsize if owns_figure else None, color=color, ax=ax
     )
-    ax = country_days.plot(kind="bar", figsize=figsize, color=color)
     ax.set_yscale("log" if log_scale else "linear")
-    plt.title(title)
-    plt.xlabel(xlabel)
-    plt.ylabel(ylabel)
-    plt.xticks(rotation=rotation, ha="right")
-    plt.tight_layout()
-    plt.grid(True)
-    if show:
-        plt.show()
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+    plt.setp(ax.get_xticklabels(), rotation=rotation, ha="right")
+    ax.figure.tight_layout()
+    ax.grid(True)
+    _show_or_save(ax.figure, show, out_path, close=owns_figure)